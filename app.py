@@ -1,14 +1,20 @@
+import atexit
 import logging
+import logging.handlers
 import json
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+import queue
+import threading
+import uuid
+from functools import lru_cache
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session
 from opentelemetry import trace
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.trace import SpanKind
 from opentelemetry.metrics import get_meter_provider, set_meter_provider
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
@@ -16,42 +22,78 @@ from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExp
 import time
 from opentelemetry.semconv.trace import SpanAttributes
 
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
 # Flask App Initialization
 app = Flask(__name__)
 app.secret_key = 'secret'
-COURSE_FILE = 'course_catalog.json'
+DEBUG = os.environ.get("FLASK_DEBUG") == "1"
+# Only re-check template files for changes while developing
+app.config['TEMPLATES_AUTO_RELOAD'] = DEBUG
+app.jinja_env.auto_reload = DEBUG
+COURSE_FILE = os.path.join(app.root_path, 'course_catalog.ndjson')
+# Pre-NDJSON catalog (a single JSON list), converted to COURSE_FILE at startup
+LEGACY_COURSE_FILE = os.path.join(app.root_path, 'course_catalog.json')
+LOG_FILE = os.path.join(app.root_path, 'app.log')
+REQUIRED_FIELDS = ('code', 'name')
+TRACE_SAMPLE_RATIO = 0.1
+# Regexes searched against the full request URL: the index page and static files
+TRACE_EXCLUDED_URLS = r"://[^/]+/(\?.*)?$,://[^/]+/static/"
 
 
-logging.basicConfig(
-    filename='app.log',
-    level=logging.INFO,
-    format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s"}'
-)
+# Log records are queued by request handlers and written to disk by a background thread.
+# Like basicConfig, this is skipped when the root logger already has any handler.
+root_logger = logging.getLogger()
+if not root_logger.handlers:
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(logging.Formatter(
+        '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s"}'
+    ))
+    log_queue = queue.Queue(-1)
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
 
-# OpenTelemetry Setup
-resource = Resource.create({"service.name": "course-catalog-service"})
-trace.set_tracer_provider(TracerProvider(resource=resource))
-tracer = trace.get_tracer(__name__)
+# OpenTelemetry Setup (skipped when the global provider was already configured)
+if not isinstance(trace.get_tracer_provider(), TracerProvider):
+    resource = Resource.create({"service.name": "course-catalog-service"})
+    tracer_provider = TracerProvider(
+        resource=resource,
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
 
-# Set up the Jaeger exporter
-Jaeger_exporter = JaegerExporter(
-    agent_host_name='localhost', 
-    agent_port=6831,  
-)
-span_processor = BatchSpanProcessor(Jaeger_exporter)
-trace.get_tracer_provider().add_span_processor(span_processor)
+    # Set up the OTLP exporter (local collector, forwards to Jaeger)
+    otlp_exporter = OTLPSpanExporter(
+        endpoint='localhost:4317',
+        insecure=True,
+    )
+    span_processor = BatchSpanProcessor(
+        otlp_exporter,
+        max_queue_size=4096,
+        schedule_delay_millis=1000,
+        max_export_batch_size=256,
+        export_timeout_millis=10000,
+    )
+    tracer_provider.add_span_processor(span_processor)
+    trace.set_tracer_provider(tracer_provider)
+tracer = trace.get_tracer(__name__)
 
-FlaskInstrumentor().instrument_app(app)
+FlaskInstrumentor().instrument_app(app, excluded_urls=TRACE_EXCLUDED_URLS)
 
 @app.before_request
 def add_ip_to_span():
     current_span = trace.get_current_span()
-    if current_span:
+    if current_span.is_recording():
         current_span.set_attribute("http.client_ip", request.remote_addr)
-        current_span.set_attribute("http.request_id", str(time.time()))  # Unique identifier for each request
+        current_span.set_attribute("http.request_id", uuid.uuid4().hex)  # Unique identifier for each request
 
-meter_provider = MeterProvider()
-set_meter_provider(meter_provider)
+if not isinstance(get_meter_provider(), MeterProvider):
+    set_meter_provider(MeterProvider())
 meter = get_meter_provider().get_meter("course_catalog_metrics")
 
 # Create counters and histograms for metrics
@@ -77,33 +119,138 @@ def before_request():
 
 @app.after_request
 def after_request(response):
-    route_counter.add(1, {"route": request.endpoint})  
+    endpoint = request.endpoint
+    route_counter.add(1, {"route": endpoint})  
     if hasattr(request, 'start_time'):
         duration = (time.time() - request.start_time) * 1000  
-        operation_time.record(duration, {"route": request.endpoint})  
+        operation_time.record(duration, {"route": endpoint})  
         current_span = trace.get_current_span()
         current_span.set_attribute("route_processing_time_ms", duration)
         current_span.add_event(
             "request_processed",
-            {"route": request.endpoint, "processing_time_ms": duration}
+            {"route": endpoint, "processing_time_ms": duration}
         )
-        app.logger.info(f"Processed {request.endpoint} in {duration:.2f} ms | IP: {request.remote_addr}")
+        app.logger.info(f"Processed {endpoint} in {duration:.2f} ms | IP: {request.remote_addr}")
     return response
 
 
+def dumps_json(obj):
+    """Serialize obj to a JSON string, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+# Parsed catalog, reused until the file's (mtime, size) stamp changes
+_cache = {"stamp": None, "data": None, "by_code": {}, "lock": threading.Lock()}
+# Rendered /catalog page as one (key, body) pair, where key is (catalog stamp, script root)
+_rendered_catalog = (None, None)
+
+
+def _read_courses():
+    """Parse the NDJSON file from disk, one course per line."""
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(COURSE_FILE, 'rb') as file:
+        return [loads(line) for line in file if line.strip()]
+
+def _index_courses(courses):
+    """Map each course code to its first matching course."""
+    by_code = {}
+    for course in courses:
+        by_code.setdefault(course['code'], course)
+    return by_code
+
 def load_courses():
-    """Load courses from the JSON file."""
-    if not os.path.exists(COURSE_FILE):
+    """Load courses from the NDJSON file, reusing the cached copy when unchanged."""
+    try:
+        stat = os.stat(COURSE_FILE)
+    except FileNotFoundError:
         return []
-    with open(COURSE_FILE, 'r') as file:
-        return json.load(file)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if stamp == _cache["stamp"]:
+        return _cache["data"]
+    with _cache["lock"]:
+        if stamp != _cache["stamp"]:
+            _cache["data"] = _read_courses()
+            _cache["by_code"] = _index_courses(_cache["data"])
+            _cache["stamp"] = stamp
+        return _cache["data"]
+
+def _encode_course(data):
+    """Serialize one course as a compact NDJSON line."""
+    if orjson is not None:
+        return orjson.dumps(data) + b'\n'
+    return (json.dumps(data, separators=(',', ':')) + '\n').encode()
 
 def save_courses(data):
-    """Save new course data to the JSON file."""
+    """Append new course data to the NDJSON file."""
+    line = _encode_course(data)
+    with _cache["lock"]:
+        with open(COURSE_FILE, 'ab') as file:
+            old_size = os.fstat(file.fileno()).st_size
+            file.write(line)
+            file.flush()
+            stat = os.fstat(file.fileno())
+        # Extend the cache in place only if it matched the file before the write and
+        # nobody else (e.g. another worker) appended alongside us; otherwise re-read.
+        cached = _cache["stamp"]
+        if (cached is not None and cached[1] == old_size
+                and stat.st_size == old_size + len(line)):
+            _cache["data"].append(data)
+            _cache["by_code"].setdefault(data['code'], data)
+            _cache["stamp"] = (stat.st_mtime_ns, stat.st_size)
+        else:
+            _cache["stamp"] = None
+
+def migrate_legacy_catalog():
+    """Convert an existing course_catalog.json into COURSE_FILE if that doesn't exist yet."""
+    if os.path.exists(COURSE_FILE) or not os.path.exists(LEGACY_COURSE_FILE):
+        return
+    with open(LEGACY_COURSE_FILE, 'rb') as file:
+        courses = json.load(file)
+    tmp_file = f"{COURSE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as file:
+        for course in courses:
+            file.write(_encode_course(course))
+    try:
+        # link() refuses to overwrite, so a worker that converts second can't clobber
+        # courses appended after the first conversion
+        os.link(tmp_file, COURSE_FILE)
+    except FileExistsError:
+        return
+    finally:
+        os.remove(tmp_file)
+    app.logger.warning(
+        f"Converted {len(courses)} courses from {LEGACY_COURSE_FILE} to {COURSE_FILE}"
+    )
+
+@lru_cache(maxsize=32)
+def _cached_endpoint_url(script_root, endpoint):
+    return url_for(endpoint)
+
+def endpoint_url(endpoint):
+    """Build the URL for an endpoint that takes no arguments, cached per script root."""
+    return _cached_endpoint_url(request.script_root, endpoint)
+
+def _catalog_snapshot():
+    """Return (stamp, courses, by_code) from one generation of the cache.
+
+    stamp is None when the file is missing or the cache was reloaded concurrently.
+    """
     courses = load_courses()
-    courses.append(data)
-    with open(COURSE_FILE, 'w') as file:
-        json.dump(courses, file, indent=4)
+    with _cache["lock"]:
+        if courses is _cache["data"]:
+            return _cache["stamp"], courses, _cache["by_code"]
+    return None, courses, _index_courses(courses)
+
+def get_course(code):
+    """Look up a single course by its code."""
+    _, _, by_code = _catalog_snapshot()
+    return by_code.get(code)
+
+# Catalog startup: convert a legacy JSON catalog, then parse it once so the
+# first request is served from memory
+migrate_legacy_catalog()
+load_courses()
 
 # Routes
 @app.route('/')
@@ -112,70 +259,73 @@ def index():
 
 @app.route('/catalog')
 def course_catalog():
+    global _rendered_catalog
     with tracer.start_as_current_span("course_catalog_route") as span:
-        courses = load_courses()
+        stamp, courses, _ = _catalog_snapshot()
         span.set_attribute("total_courses", len(courses))
         span.set_attribute("route", "/catalog")           
         app.logger.info(
             f"Course Catalog accessed | Total Courses: {len(courses)} | IP: {request.remote_addr}"
         )
         route_counter.add(1, {"route": "/catalog"})
-    return render_template('course_catalog.html', courses=courses)
+    # Pending flash messages are rendered into the page, and auto-reloaded templates
+    # must show edits immediately, so neither case is cached
+    if stamp is None or '_flashes' in session or app.jinja_env.auto_reload:
+        return render_template('course_catalog.html', courses=courses)
+    # Links in the page are built with url_for, so they depend on the mount prefix
+    key = (stamp, request.script_root)
+    cached_key, body = _rendered_catalog
+    if cached_key != key:
+        body = render_template('course_catalog.html', courses=courses).encode()
+        _rendered_catalog = (key, body)
+    return Response(body, mimetype='text/html')
 
 @app.route('/add_course', methods=['GET', 'POST'])
 def add_course():
+    client_ip = request.remote_addr
     with tracer.start_as_current_span("add_course_route") as span:
-        span.set_attribute("client.ip", request.remote_addr)
+        span.set_attribute("client.ip", client_ip)
         span.set_attribute("client.host", request.host)
         
         if request.method == 'POST':
-            required_fields = ['code', 'name']
-            missing_fields = [field for field in required_fields if not request.form.get(field)]
-            if missing_fields:
-                error_message = f"Missing fields: {', '.join(missing_fields)}"
+            if not all(request.form.get(field) for field in REQUIRED_FIELDS):
+                missing_fields = [field for field in REQUIRED_FIELDS if not request.form.get(field)]
+                missing_str = ", ".join(missing_fields)
+                error_message = f"Missing fields: {missing_str}"
                 error_counter.add(1, {"route": "/add_course", "error_type": "missing_fields"})
                 
-                with tracer.start_as_current_span(
-                    "form_validation_error",
-                    kind=SpanKind.INTERNAL,
+                span.set_attribute("error", True)
+                span.set_attribute("error_type", "missing_fields")
+                span.set_attribute("error.type", "missing_fields")
+                span.set_attribute("missing_fields", missing_fields)
+                span.set_attribute("total_errors", len(missing_fields))
+                span.set_attribute("operation.type", "form_validation")
+                span.set_status(trace.Status(trace.StatusCode.ERROR))
+                span.record_exception(ValueError(error_message))
+                span.add_event(
+                    "validation_failed",
                     attributes={
-                        "error.type": "missing_fields",
-                        "missing_fields": str(missing_fields),
-                        "total_errors": len(missing_fields),
-                        "operation.type": "form_validation",
-                        "client.ip": request.remote_addr,  
-                        "client.host": request.host
+                        "error_count": len(missing_fields),
+                        "timestamp": time.time(),
+                        "fields_missing": missing_str
                     }
-                ) as error_span:
-                    error_span.set_status(trace.Status(trace.StatusCode.ERROR))
-                    error_span.record_exception(ValueError(error_message))
-                    error_span.add_event(
-                        "validation_failed",
-                        attributes={
-                            "error_count": len(missing_fields),
-                            "timestamp": time.time(),
-                            "fields_missing": str(missing_fields),
-                            "client.ip": request.remote_addr 
-                        }
-                    )
-                    
+                )
+                
+                if app.logger.isEnabledFor(logging.ERROR):
                     app.logger.error(
-                        json.dumps({
+                        dumps_json({
                             "event": "form_validation_error",
                             "error_type": "missing_fields",
                             "missing_fields": missing_fields,
                             "total_errors": len(missing_fields),
-                            "ip_address": request.remote_addr,
-                            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S')
+                            "ip_address": client_ip
                         })
                     )
                 
-                span.set_attribute("error", True)
-                span.set_attribute("error_type", "missing_fields")
                 span.add_event("error_occurred", {"message": error_message})
-                app.logger.error(f"Form validation failed - {error_message} | IP: {request.remote_addr}")
+                app.logger.error(f"Form validation failed - {error_message} | IP: {client_ip}")
                 flash(error_message, "error")
-                return redirect(url_for('add_course'))
+                return redirect(endpoint_url('add_course'))
             
             course = {
                 'code': request.form['code'],
@@ -191,54 +341,42 @@ def add_course():
             save_courses(course)
             span.set_attribute("added_course", course['name'])
             app.logger.info(
-                f"Course added | Code: {course['code']} | Name: {course['name']} | IP: {request.remote_addr}"
+                f"Course added | Code: {course['code']} | Name: {course['name']} | IP: {client_ip}"
             )
             flash(f"Course '{course['name']}' added successfully!", "success")
-            return redirect(url_for('course_catalog'))
+            return redirect(endpoint_url('course_catalog'))
         app.logger.info("Rendered Add Course page")
     return render_template('add_course.html')
 
 
 @app.route('/course/<code>')
 def course_details(code):
+    client_ip = request.remote_addr
     with tracer.start_as_current_span("course_details_route") as span:
-        span.set_attribute("client.ip", request.remote_addr)
+        span.set_attribute("client.ip", client_ip)
         span.set_attribute("client.host", request.host)
-        span.set_attribute("request.headers", str(dict(request.headers)))
         
-        courses = load_courses()
-        course = next((course for course in courses if course['code'] == code), None)
+        course = get_course(code)
         if not course:
             error_counter.add(1, {"route": "/course/<code>", "error_type": "not_found"})
+            span.set_attribute("error", True)
             flash(f"No course found with code '{code}'.", "error")
-            return redirect(url_for('course_catalog'))
+            return redirect(endpoint_url('course_catalog'))
             
-        with tracer.start_as_current_span(
-            f"view_course_{code}",
-            kind=SpanKind.INTERNAL,
+        span.add_event(
+            "view_course",
             attributes={
                 "course.code": code,
                 "course.name": course['name'],
                 "course.instructor": course['instructor'],
                 "course.semester": course['semester'],
-                "operation.type": "course_view",
-                "client.ip": request.remote_addr,  # Add IP to course view span
-                "client.host": request.host
+                "operation.type": "course_view"
             }
-        ) as course_span:
-            course_span.add_event(
-                "course_accessed",
-                attributes={
-                    "course.code": code,
-                    "timestamp": time.time(),
-                    "client.ip": request.remote_addr  
-                }
-            )
-            
-            span.set_attribute("viewed_course", course['name'])
-            app.logger.info(
-                f"Course Details Viewed | Code: {code} | Name: {course['name']} | IP: {request.remote_addr}"
-            )
+        )
+        span.set_attribute("viewed_course", course['name'])
+        app.logger.info(
+            f"Course Details Viewed | Code: {code} | Name: {course['name']} | IP: {client_ip}"
+        )
             
     return render_template('course_details.html', course=course)
 
@@ -246,4 +384,4 @@ if __name__ == '__main__':
     port = 5000
     host = '127.0.0.1'
     print(f"Server running at: http://{host}:{port}")
-    app.run(debug=True, host=host, port=port)
+    app.run(debug=DEBUG, host=host, port=port)
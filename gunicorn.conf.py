@@ -0,0 +1,9 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+bind = '127.0.0.1:5000'
+workers = 4
+worker_class = 'gthread'
+threads = 4
+
+# Each worker must import the app itself so it starts its own span processor
+# and log listener threads; those threads do not survive a fork.
+preload_app = False